@@ -4,12 +4,14 @@ FastAPI application for the Brikkle chatbot with RAG system.
 
 import os
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import asynccontextmanager
 from typing import Dict, Any
 
 from fastapi import FastAPI, HTTPException, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
 from fastapi.openapi.docs import get_swagger_ui_html
 from fastapi.openapi.utils import get_openapi
 from dotenv import load_dotenv
@@ -36,32 +38,74 @@ async def lifespan(app: FastAPI):
     """
     # Startup
     logger.info("Starting Brikkle Chatbot API...")
-    
+
     # Initialize services
     try:
         from services.service import get_rag_service
         from services.chat_service import get_chat_service
-        
+        from services.chat_history_service import get_chat_history_service
+        from services.semantic_cache import get_semantic_cache
+        from services.batcher import get_dyn_batcher
+
         # Initialize RAG service (this will create/load FAISS index)
         logger.info("Initializing RAG service...")
         rag_service = get_rag_service()
         logger.info(f"RAG service initialized with {rag_service.get_stats()['total_documents']} documents")
-        
+
         # Initialize chat service
         logger.info("Initializing chat service...")
         chat_service = get_chat_service()
         logger.info("Chat service initialized successfully")
-        
+
+        # Warm the Gemini connection before serving traffic so the first
+        # real request doesn't pay for TLS setup and client lazy-init
+        try:
+            await chat_service.llm.ainvoke("ping")
+            logger.info("LLM warmup call completed")
+        except Exception as e:
+            logger.warning(f"LLM warmup call failed (continuing): {e}")
+
+        # Start the dynamic request batcher
+        logger.info("Starting dynamic request batcher...")
+        dyn_batcher = get_dyn_batcher()
+        await dyn_batcher.start()
+
+        # Resolve the singletons once so request handlers can dereference
+        # them from app.state instead of calling get_*_service() per request
+        app.state.rag_service = rag_service
+        app.state.chat_service = chat_service
+        app.state.history_service = get_chat_history_service()
+        await app.state.history_service.start_writer()
+        app.state.semantic_cache = get_semantic_cache()
+        app.state.dyn_batcher = dyn_batcher
+
+        # Dedicated bounded pool for embedding calls so they never compete
+        # with other offloaded work for the shared request thread pool.
+        # Embedding goes through the Google API (network-bound), so threads
+        # are the right executor here; a process pool would only add IPC
+        app.state.embed_executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv("EMBED_WORKERS", str(os.cpu_count() or 4))),
+            thread_name_prefix="embed"
+        )
+
+        # Freeze the OpenAPI schema before serving traffic so concurrent
+        # first requests to /docs or /openapi.json never regenerate it
+        app.openapi()
+        logger.info("OpenAPI schema generated and cached")
+
         logger.info("All services initialized successfully")
-        
+
     except Exception as e:
         logger.error(f"Failed to initialize services: {e}")
         raise
-    
+
     yield
-    
+
     # Shutdown
     logger.info("Shutting down Brikkle Chatbot API...")
+    await get_dyn_batcher().stop()
+    await app.state.history_service.stop_writer()
+    app.state.embed_executor.shutdown(wait=False)
 
 
 # Create FastAPI application
@@ -85,18 +129,31 @@ app = FastAPI(
     docs_url="/docs",
     redoc_url="/redoc",
     openapi_url="/openapi.json",
+    default_response_class=ORJSONResponse,
     lifespan=lifespan
 )
 
-# Add CORS middleware
+# Add CORS middleware with an explicit origin list; a wildcard with
+# credentials is unsafe and forces the middleware's slow per-request path
+allowed_origins = [
+    origin.strip()
+    for origin in os.getenv("ALLOWED_ORIGINS", "http://localhost:3000,https://app.brikkle.io").split(",")
+    if origin.strip()
+]
+
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],  # Configure this properly for production
+    allow_origins=allowed_origins,
     allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_methods=["GET", "POST"],
+    allow_headers=["Content-Type", "Authorization"],
+    max_age=86400,  # Let browsers cache preflight responses for a day
 )
 
+# Compress responses above 512 bytes; chat responses with sources are
+# highly compressible JSON and the CPU cost is negligible next to the LLM
+app.add_middleware(GZipMiddleware, minimum_size=512, compresslevel=5)
+
 
 # Custom OpenAPI schema
 def custom_openapi():
@@ -154,13 +211,13 @@ async def root():
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request, exc):
     """Handle HTTP exceptions with custom error response."""
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=exc.status_code,
         content=ErrorResponse(
             error=exc.detail,
             detail=f"HTTP {exc.status_code} error",
             timestamp=datetime.now()
-        ).dict()
+        ).model_dump()
     )
 
 
@@ -168,13 +225,13 @@ async def http_exception_handler(request, exc):
 async def general_exception_handler(request, exc):
     """Handle general exceptions."""
     logger.error(f"Unhandled exception: {exc}")
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
         content=ErrorResponse(
             error="Internal server error",
             detail="An unexpected error occurred. Please try again later.",
             timestamp=datetime.now()
-        ).dict()
+        ).model_dump()
     )
 
 
@@ -187,18 +244,25 @@ async def health():
 
 if __name__ == "__main__":
     import uvicorn
-    
+
     # Get configuration from environment variables
     host = os.getenv("HOST", "0.0.0.0")
     port = int(os.getenv("PORT", 8000))
     debug = os.getenv("DEBUG", "false").lower() == "true"
-    
+
     logger.info(f"Starting server on {host}:{port}")
-    
+
+    # Silence the access logger even if another process enables it
+    logging.getLogger("uvicorn.access").addFilter(lambda record: False)
+
     uvicorn.run(
         "app:app",
         host=host,
         port=port,
         reload=debug,
-        log_level="info"
+        log_level="warning",
+        access_log=False,
+        loop="uvloop",
+        http="httptools",
+        workers=int(os.getenv("WORKERS", "1"))
     )
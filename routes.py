@@ -1,151 +1,192 @@
-"""
-FastAPI routes for the Brikkle chatbot API.
-Simplified to have only one main chat endpoint with automatic session management.
-"""
-
-import logging
-from typing import Dict, Any, Optional
-from datetime import datetime
-
-from fastapi import APIRouter, HTTPException, status
-from fastapi.responses import JSONResponse
-
-from schema import (
-    ChatRequest, 
-    ChatResponse, 
-    HealthResponse, 
-    ErrorResponse,
-    ChatMessage
-)
-from services.chat_service import get_chat_service
-from services.service import get_rag_service
-from services.chat_history_service import get_chat_history_service
-
-# Configure logging
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
-
-# Create router
-router = APIRouter(prefix="/api/v1", tags=["chatbot"])
-
-
-@router.get("/health", response_model=HealthResponse)
-async def health_check():
-    """
-    Health check endpoint to verify the service is running.
-    """
-    try:
-        return HealthResponse(
-            status="healthy",
-            timestamp=datetime.now(),
-            version="1.0.0"
-        )
-    except Exception as e:
-        logger.error(f"Health check failed: {e}")
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Service is unhealthy"
-        )
-
-
-@router.post("/chat", response_model=Dict[str, Any])
-async def chat_endpoint(request: ChatRequest):
-    """
-    Main chat endpoint for interacting with the Brikkle chatbot.
-    
-    This endpoint:
-    1. Automatically manages sessions (creates new session if none provided)
-    2. Takes a user message and optional session_id
-    3. Retrieves last 5 messages for context
-    4. Generates response using RAG and Google Generative AI
-    5. Stores both user message and AI response
-    6. Returns response with session_id for frontend to track
-    
-    The frontend should store the session_id and pass it with each request.
-    If no session_id is provided, a new session is automatically created.
-    """
-    try:
-        logger.info(f"Received chat request: {request.message[:50]}...")
-        
-        # Get services
-        chat_service = get_chat_service()
-        history_service = get_chat_history_service()
-        
-        # Get or create session
-        session_id = getattr(request, 'session_id', None)
-        if not session_id:
-            session_id = history_service.create_session()
-            logger.info(f"Created new session: {session_id}")
-        
-        # Get last 5 messages for context
-        conversation_history = history_service.get_session_history(session_id, limit=5)
-        
-        # Generate response
-        response = chat_service.generate_response(
-            message=request.message,
-            conversation_history=conversation_history,
-            include_sources=getattr(request, 'include_sources', False)
-        )
-        
-        # Store user message
-        history_service.add_message(
-            session_id=session_id,
-            role="user",
-            content=request.message
-        )
-        
-        # Store assistant response
-        history_service.add_message(
-            session_id=session_id,
-            role="assistant",
-            content=response.message,
-            metadata={"sources_count": len(response.sources) if response.sources else 0}
-        )
-        
-        # Return simplified response with session_id
-        return {
-            "message": response.message,
-            "session_id": session_id,
-            "timestamp": response.timestamp.isoformat(),
-            "sources": response.sources if getattr(request, 'include_sources', False) else None
-        }
-        
-    except ValueError as e:
-        logger.error(f"Validation error: {e}")
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=str(e)
-        )
-    except Exception as e:
-        logger.error(f"Error processing chat request: {e}")
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="An error occurred while processing your request. Please try again."
-        )
-
-
-@router.get("/stats", response_model=Dict[str, Any])
-async def get_service_stats():
-    """
-    Get statistics about the RAG service, vector store, and chat history.
-    """
-    try:
-        rag_service = get_rag_service()
-        history_service = get_chat_history_service()
-        
-        rag_stats = rag_service.get_stats()
-        memory_stats = history_service.get_memory_stats()
-        
-        return {
-            "rag_service": rag_stats,
-            "chat_history": memory_stats,
-            "timestamp": datetime.now().isoformat(),
-            "status": "operational"
-        }
-        
-    except Exception as e:
-        logger.error(f"Error getting service stats: {e}")
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Failed to retrieve service statistics"
-        )
+"""
+FastAPI routes for the Brikkle chatbot API.
+Simplified to have only one main chat endpoint with automatic session management.
+"""
+
+import asyncio
+import logging
+from typing import Dict, Any, Optional
+from datetime import datetime
+
+from fastapi import APIRouter, HTTPException, Request, status
+from fastapi.responses import ORJSONResponse
+
+from schema import (
+    ChatRequest,
+    ChatResponse,
+    HealthResponse,
+    ErrorResponse,
+    ChatMessage
+)
+
+# Logging is configured once by the application entry point
+logger = logging.getLogger(__name__)
+
+# Create router; serialize responses with orjson even if the router is
+# mounted on an app without an ORJSON default
+router = APIRouter(
+    prefix="/api/v1",
+    tags=["chatbot"],
+    default_response_class=ORJSONResponse
+)
+
+
+@router.get("/health", response_model=HealthResponse)
+async def health_check():
+    """
+    Health check endpoint to verify the service is running.
+    """
+    try:
+        return HealthResponse(
+            status="healthy",
+            timestamp=datetime.now(),
+            version="1.0.0"
+        )
+    except Exception as e:
+        logger.error("Health check failed: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Service is unhealthy"
+        )
+
+
+@router.post("/chat", response_model=Dict[str, Any])
+async def chat_endpoint(request: ChatRequest, http_request: Request):
+    """
+    Main chat endpoint for interacting with the Brikkle chatbot.
+    
+    This endpoint:
+    1. Automatically manages sessions (creates new session if none provided)
+    2. Takes a user message and optional session_id
+    3. Retrieves last 5 messages for context
+    4. Generates response using RAG and Google Generative AI
+    5. Stores both user message and AI response
+    6. Returns response with session_id for frontend to track
+    
+    The frontend should store the session_id and pass it with each request.
+    If no session_id is provided, a new session is automatically created.
+    """
+    try:
+        logger.info("Received chat request: %.50s...", request.message)
+        
+        # Services are resolved once at startup and stored on app.state
+        state = http_request.app.state
+        history_service = state.history_service
+        semantic_cache = state.semantic_cache
+
+        # Get or create session
+        session_id = getattr(request, 'session_id', None)
+        if not session_id:
+            session_id = history_service.create_session()
+            logger.info("Created new session: %s", session_id)
+
+        # Check the semantic cache before running the RAG + LLM pipeline.
+        # Embedding is a blocking network call, so run it on the dedicated
+        # bounded embedding pool instead of the shared request thread pool
+        query_vector = await asyncio.get_running_loop().run_in_executor(
+            state.embed_executor, semantic_cache.embed_message, request.message
+        )
+        # Entries cached without sources (e.g. from a Redis exact-match
+        # hit) don't satisfy callers that asked for sources
+        cached = semantic_cache.lookup(
+            query_vector,
+            require_sources=getattr(request, 'include_sources', False)
+        )
+
+        if cached is not None:
+            # A cache hit doesn't depend on prior turns, so skip the
+            # history read entirely
+            response_message = cached["message"]
+            response_sources = cached["sources"]
+            response_timestamp = datetime.now()
+        else:
+            # Get last 5 messages for context
+            conversation_history = history_service.get_session_history(session_id, limit=5)
+
+            # Generate response through the dynamic batcher so concurrent
+            # requests share embedding/retrieval/LLM calls. The embedding
+            # computed for the cache check rides along so the batch path
+            # doesn't embed the same message a second time. Sources always
+            # come back so the cache entry keeps them; whether they appear
+            # in the payload is decided below
+            response = await state.dyn_batcher.process_batched({
+                "message": request.message,
+                "query_vector": query_vector[0] if query_vector is not None else None,
+                "history": conversation_history
+            })
+            response_message = response.message
+            response_sources = response.sources
+            response_timestamp = response.timestamp
+
+            # Cache the generated response for future similar queries.
+            # Fallback apologies are flagged non-cacheable: serving one as
+            # a semantic hit would keep apologizing long after the backend
+            # recovered
+            if response.cacheable:
+                await semantic_cache.add(
+                    query_vector,
+                    request.message,
+                    response_message,
+                    response_sources
+                )
+
+        # Queue both history writes; they drain in the background so the
+        # response isn't blocked on bookkeeping
+        history_service.add_message_async(
+            session_id=session_id,
+            role="user",
+            content=request.message
+        )
+        history_service.add_message_async(
+            session_id=session_id,
+            role="assistant",
+            content=response_message,
+            metadata={"sources_count": len(response_sources) if response_sources else 0}
+        )
+
+        # Return simplified response with session_id
+        return {
+            "message": response_message,
+            "session_id": session_id,
+            "timestamp": response_timestamp.isoformat(),
+            "sources": response_sources if getattr(request, 'include_sources', False) else None
+        }
+        
+    except ValueError as e:
+        logger.error("Validation error: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        logger.error("Error processing chat request: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="An error occurred while processing your request. Please try again."
+        )
+
+
+@router.get("/stats", response_model=Dict[str, Any])
+async def get_service_stats(http_request: Request):
+    """
+    Get statistics about the RAG service, vector store, and chat history.
+    """
+    try:
+        state = http_request.app.state
+
+        rag_stats = state.rag_service.get_stats()
+        memory_stats = state.history_service.get_memory_stats()
+        
+        return {
+            "rag_service": rag_stats,
+            "chat_history": memory_stats,
+            "timestamp": datetime.now().isoformat(),
+            "status": "operational"
+        }
+        
+    except Exception as e:
+        logger.error("Error getting service stats: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to retrieve service statistics"
+        )
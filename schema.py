@@ -2,19 +2,23 @@
 Pydantic schemas for the Brikkle chatbot API.
 """
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from typing import List, Optional, Dict, Any
 from datetime import datetime
 
 
 class ChatMessage(BaseModel):
     """Individual chat message schema."""
+    model_config = ConfigDict(extra='ignore')
+
     role: str = Field(..., description="Role of the message sender (user/assistant)")
     content: str = Field(..., description="Content of the message")
 
 
 class ChatRequest(BaseModel):
     """Request schema for chat endpoint with automatic session management."""
+    model_config = ConfigDict(extra='ignore', str_strip_whitespace=True)
+
     message: str = Field(..., description="User's message", min_length=1, max_length=1000)
     session_id: Optional[str] = Field(None, description="Session ID (creates new if not provided)")
     include_sources: Optional[bool] = Field(
@@ -25,6 +29,8 @@ class ChatRequest(BaseModel):
 
 class SourceDocument(BaseModel):
     """Source document schema for RAG responses."""
+    model_config = ConfigDict(extra='ignore')
+
     content: str = Field(..., description="Relevant document content")
     metadata: Dict[str, Any] = Field(default={}, description="Document metadata")
     score: Optional[float] = Field(None, description="Relevance score")
@@ -32,6 +38,8 @@ class SourceDocument(BaseModel):
 
 class ChatResponse(BaseModel):
     """Response schema for chat endpoint."""
+    model_config = ConfigDict(extra='ignore')
+
     message: str = Field(..., description="Assistant's response")
     sources: Optional[List[SourceDocument]] = Field(
         default=None, 
@@ -39,6 +47,11 @@ class ChatResponse(BaseModel):
     )
     timestamp: datetime = Field(default_factory=datetime.now, description="Response timestamp")
     conversation_id: Optional[str] = Field(None, description="Unique conversation identifier")
+    cacheable: bool = Field(
+        default=True,
+        exclude=True,
+        description="Internal flag: False for fallback responses caches must not store"
+    )
 
 
 class HealthResponse(BaseModel):
@@ -71,6 +84,8 @@ class ChatSessionResponse(BaseModel):
 
 class ChatHistoryRequest(BaseModel):
     """Request schema for chat with session management."""
+    model_config = ConfigDict(extra='ignore', str_strip_whitespace=True)
+
     message: str = Field(..., description="User's message", min_length=1, max_length=1000)
     session_id: Optional[str] = Field(None, description="Session ID (creates new if not provided)")
     include_sources: Optional[bool] = Field(default=True, description="Whether to include source documents")
@@ -6,9 +6,13 @@ Contains all service modules for RAG, chat, and history management.
 from .service import get_rag_service
 from .chat_service import get_chat_service
 from .chat_history_service import get_chat_history_service
+from .semantic_cache import get_semantic_cache
+from .batcher import get_dyn_batcher
 
 __all__ = [
     'get_rag_service',
-    'get_chat_service', 
-    'get_chat_history_service'
+    'get_chat_service',
+    'get_chat_history_service',
+    'get_semantic_cache',
+    'get_dyn_batcher'
 ]
@@ -0,0 +1,178 @@
+"""
+Dynamic request batcher for the Brikkle chatbot.
+Coalesces concurrent generation requests into small batches so that
+embedding, retrieval, and LLM overhead is amortized across users.
+"""
+
+import asyncio
+import logging
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Logging is configured once by the application entry point
+logger = logging.getLogger(__name__)
+
+
+class DynBatcher:
+    """
+    Batches in-flight generation requests within a short delay window.
+
+    Requests submitted via process_batched are queued; a background worker
+    collects up to max_batch_size items within max_delay seconds and hands
+    them to the infer callable as one batch, then distributes results back
+    to the awaiting callers.
+    """
+
+    def __init__(self,
+                 infer: Callable[[List[Dict[str, Any]]], List[Any]],
+                 max_batch_size: int = 8,
+                 max_delay: float = 0.05):
+        """
+        Initialize the dynamic batcher.
+
+        Args:
+            infer: Callable that processes a list of request dicts and
+                returns a list of results in the same order
+            max_batch_size: Maximum number of requests per batch
+            max_delay: Maximum time in seconds to wait for a batch to fill
+        """
+        self.infer = infer
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker_task: Optional[asyncio.Task] = None
+        self._dispatch_tasks: set = set()
+
+    async def start(self) -> None:
+        """Start the background batching worker."""
+        if self._worker_task is not None:
+            return
+        self._queue = asyncio.Queue()
+        self._worker_task = asyncio.create_task(self._worker())
+        logger.info("Dynamic batcher started (max_batch_size=%d, max_delay=%ss)", self.max_batch_size, self.max_delay)
+
+    async def stop(self) -> None:
+        """
+        Stop the background batching worker.
+
+        In-flight dispatches are awaited so their callers get real
+        results, and anything still queued is failed fast instead of
+        leaving requests hanging forever.
+        """
+        if self._worker_task is not None:
+            self._worker_task.cancel()
+            try:
+                await self._worker_task
+            except asyncio.CancelledError:
+                pass
+            self._worker_task = None
+
+            # Let dispatches that already reached the LLM finish
+            if self._dispatch_tasks:
+                await asyncio.gather(*self._dispatch_tasks, return_exceptions=True)
+
+            # Fail whatever never made it into a batch
+            while self._queue is not None and not self._queue.empty():
+                _, future = self._queue.get_nowait()
+                if not future.done():
+                    future.set_exception(RuntimeError("Dynamic batcher stopped"))
+            self._queue = None
+
+            logger.info("Dynamic batcher stopped")
+
+    async def process_batched(self, item: Dict[str, Any]) -> Any:
+        """
+        Submit a request for batched processing and wait for its result.
+
+        Args:
+            item: Request dict passed through to the infer callable
+
+        Returns:
+            The result produced by infer for this item
+        """
+        if self._queue is None:
+            # Batcher not started (e.g., direct service usage) - process alone
+            results = await self._run_infer([item])
+            return results[0]
+
+        future: asyncio.Future = asyncio.get_running_loop().create_future()
+        await self._queue.put((item, future))
+        return await future
+
+    async def _worker(self) -> None:
+        """Collect queued requests into batches and dispatch them."""
+        while True:
+            item, future = await self._queue.get()
+            batch: List[Tuple[Dict[str, Any], asyncio.Future]] = [(item, future)]
+
+            try:
+                # Collect more items within the delay window, up to the batch cap
+                deadline = asyncio.get_running_loop().time() + self.max_delay
+                while len(batch) < self.max_batch_size:
+                    remaining = deadline - asyncio.get_running_loop().time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+                    except asyncio.TimeoutError:
+                        break
+            except asyncio.CancelledError:
+                # stop() cancelled us mid-collection: the items gathered so
+                # far are referenced only here, so dispatch them before
+                # re-raising or their callers would await forever. stop()
+                # awaits the dispatch task before returning
+                self._dispatch_in_background(batch)
+                raise
+
+            # Dispatch in the background and keep collecting: a batch's
+            # LLM round-trip takes seconds, and awaiting it here would
+            # serialize the whole service to one batch per LLM latency.
+            # The chat service's semaphore bounds LLM concurrency
+            self._dispatch_in_background(batch)
+
+    def _dispatch_in_background(self, batch: List[Tuple[Dict[str, Any], asyncio.Future]]) -> None:
+        """Start a tracked background task dispatching the batch."""
+        task = asyncio.create_task(self._dispatch(batch))
+        self._dispatch_tasks.add(task)
+        task.add_done_callback(self._dispatch_tasks.discard)
+
+    async def _dispatch(self, batch: List[Tuple[Dict[str, Any], asyncio.Future]]) -> None:
+        """Run infer on a collected batch and resolve the waiting futures."""
+        items = [item for item, _ in batch]
+        try:
+            logger.info("Dispatching batch of %d request(s)", len(items))
+            results = await self._run_infer(items)
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+        except Exception as e:
+            logger.error("Error processing batch: %s", e)
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+
+    async def _run_infer(self, items: List[Dict[str, Any]]) -> List[Any]:
+        """Invoke the infer callable, supporting sync and async callables."""
+        result = self.infer(items)
+        if asyncio.iscoroutine(result):
+            result = await result
+        return result
+
+
+# Global dynamic batcher instance
+dyn_batcher = None
+
+
+def get_dyn_batcher() -> DynBatcher:
+    """Get the global dynamic batcher instance."""
+    global dyn_batcher
+    if dyn_batcher is None:
+        from .chat_service import get_chat_service
+        # The async batch path keeps blocking work in worker threads and
+        # drives the Gemini calls through the LLM's async interface
+        dyn_batcher = DynBatcher(
+            infer=lambda items: get_chat_service().agenerate_response_batch(items),
+            max_batch_size=8,
+            max_delay=0.05
+        )
+    return dyn_batcher
@@ -1,219 +1,533 @@
-"""
-Chat service for the Brikkle chatbot using LangChain and Google Generative AI.
-Handles conversation management and response generation.
-"""
-
-import os
-import logging
-from typing import List, Dict, Any, Optional
-from datetime import datetime
-
-from langchain.prompts import ChatPromptTemplate
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain.schema import HumanMessage, AIMessage, SystemMessage
-
-from .service import get_rag_service
-from schema import ChatMessage, ChatResponse, SourceDocument
-
-# Configure logging
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
-
-
-class ChatService:
-    """
-    Chat service that handles conversation management and response generation
-    using LangChain and Google Generative AI.
-    """
-    
-    def __init__(self, api_key: Optional[str] = None,):
-        """
-        Initialize the chat service.
-        
-        Args:
-            api_key: Google Generative AI API key (if not provided, will use env var)
-        """
-        self.api_key = api_key or os.getenv("GOOGLE_API_KEY")
-        if not self.api_key:
-            raise ValueError("Google API key is required. Set GOOGLE_API_KEY environment variable.")
-        
-        # Initialize the language model
-        self.llm = ChatGoogleGenerativeAI(
-            model="gemini-1.5-flash",
-            google_api_key=self.api_key,
-            temperature=0.7,
-            max_output_tokens=2048
-        )
-        
-        # Initialize RAG service
-        self.rag_service = get_rag_service()
-        
-        # Create the chat prompt template
-        self.chat_prompt = self._create_chat_prompt()
-        
-        logger.info("Chat service initialized successfully")
-    
-    def _create_chat_prompt(self) -> ChatPromptTemplate:
-        """Create the chat prompt template for the Brikkle chatbot."""
-        
-        system_prompt = """You are a helpful AI assistant for Brikkle, Nigeria's first blockchain-powered real estate investment platform. 
-
-Your role is to help users understand:
-- How Brikkle works and its core value proposition
-- Investment opportunities and property tokenization
-- Account setup, verification, and payment processes
-- Property due diligence and investment strategies
-- Platform features, security, and compliance
-- Technical support and troubleshooting
-
-Guidelines:
-1. Always be helpful, accurate, and professional
-2. Use the provided context from Brikkle's knowledge base to answer questions
-3. If you don't have specific information, clearly state that and suggest contacting support
-4. Focus on Nigerian real estate investment context
-5. Explain complex blockchain and investment concepts in simple terms
-6. Always mention relevant minimum investment amounts, fees, and requirements
-7. Encourage users to verify information and do their own research
-
-Context from Brikkle Knowledge Base:
-{context}
-
-Previous conversation:
-{chat_history}
-
-User's question: {question}
-
-Please provide a helpful and accurate response based on the context above."""
-
-        return ChatPromptTemplate.from_messages([
-            ("system", system_prompt),
-            ("human", "{question}")
-        ])
-    
-    def _format_chat_history(self, conversation_history: List[ChatMessage]) -> str:
-        """Format conversation history for the prompt."""
-        if not conversation_history:
-            return "No previous conversation."
-        
-        # Keep only the last 5 messages for context to avoid token limits
-        recent_messages = conversation_history[-5:]
-        
-        formatted_history = []
-        for msg in recent_messages:
-            if msg.role == "user":
-                formatted_history.append(f"User: {msg.content}")
-            elif msg.role == "assistant":
-                formatted_history.append(f"Assistant: {msg.content}")
-        
-        return "\n".join(formatted_history)
-    
-    def _format_context(self, source_docs: List[SourceDocument]) -> str:
-        """Format retrieved documents as context for the prompt."""
-        if not source_docs:
-            return "No relevant context found."
-        
-        context_parts = []
-        for i, doc in enumerate(source_docs, 1):
-            context_parts.append(f"Source {i} (Relevance: {doc.score:.2f}):\n{doc.content}\n")
-        
-        return "\n".join(context_parts)
-    
-    def generate_response(self, 
-                         message: str, 
-                         conversation_history: List[ChatMessage] = None,
-                         include_sources: bool = True) -> ChatResponse:
-        """
-        Generate a response to the user's message using RAG.
-        
-        Args:
-            message: User's message
-            conversation_history: Previous conversation messages (limited to last 5 for context)
-            include_sources: Whether to include source documents in response
-            
-        Returns:
-            ChatResponse with the generated message and sources
-        """
-        try:
-            # Retrieve relevant documents
-            logger.info(f"Retrieving documents for query: {message[:50]}...")
-            source_docs = self.rag_service.retrieve_documents(
-                query=message,
-                k=5,
-                score_threshold=0.6
-            )
-            
-            # Format context and chat history
-            context = self._format_context(source_docs)
-            chat_history = self._format_chat_history(conversation_history or [])
-            
-            # Create the prompt
-            prompt = self.chat_prompt.format(
-                context=context,
-                chat_history=chat_history,
-                question=message
-            )
-            
-            # Generate response
-            logger.info("Generating response with Google Generative AI...")
-            response = self.llm.invoke(prompt)
-            
-            # Extract the response content
-            response_content = response.content if hasattr(response, 'content') else str(response)
-            
-            # Create the chat response
-            chat_response = ChatResponse(
-                message=response_content,
-                sources=source_docs if include_sources else None,
-                timestamp=datetime.now()
-            )
-            
-            logger.info("Response generated successfully")
-            return chat_response
-            
-        except Exception as e:
-            logger.error(f"Error generating response: {e}")
-            # Return a fallback response
-            return ChatResponse(
-                message="I apologize, but I'm experiencing technical difficulties. Please try again later or contact Brikkle support for assistance.",
-                sources=None,
-                timestamp=datetime.now()
-            )
-    
-    def get_conversation_summary(self, conversation_history: List[ChatMessage]) -> str:
-        """Generate a summary of the conversation."""
-        if not conversation_history:
-            return "No conversation history available."
-        
-        user_messages = [msg.content for msg in conversation_history if msg.role == "user"]
-        if not user_messages:
-            return "No user messages in conversation history."
-        
-        # Simple summary based on user messages
-        topics = []
-        for msg in user_messages:
-            if any(keyword in msg.lower() for keyword in ["investment", "property", "token"]):
-                topics.append("Investment and Property")
-            elif any(keyword in msg.lower() for keyword in ["account", "verification", "kyc"]):
-                topics.append("Account Setup")
-            elif any(keyword in msg.lower() for keyword in ["payment", "deposit", "withdraw"]):
-                topics.append("Payment and Transactions")
-            elif any(keyword in msg.lower() for keyword in ["help", "support", "problem"]):
-                topics.append("Support and Help")
-        
-        if topics:
-            unique_topics = list(set(topics))
-            return f"Conversation covered: {', '.join(unique_topics)}"
-        else:
-            return "General conversation about Brikkle platform"
-
-
-# Global chat service instance
-chat_service = None
-
-
-def get_chat_service() -> ChatService:
-    """Get the global chat service instance."""
-    global chat_service
-    if chat_service is None:
-        chat_service = ChatService()
-    return chat_service
+"""
+Chat service for the Brikkle chatbot using LangChain and Google Generative AI.
+Handles conversation management and response generation.
+"""
+
+import asyncio
+import hashlib
+import os
+import logging
+import re
+from collections import deque
+from typing import List, Dict, Any, Optional
+from datetime import datetime
+
+from langchain_google_genai import ChatGoogleGenerativeAI
+from langchain.schema import HumanMessage, AIMessage, SystemMessage
+
+# Redis is optional: the shared response cache is only enabled when the
+# client is installed and REDIS_URL is configured
+try:
+    import redis.asyncio as aioredis
+except ImportError:
+    aioredis = None
+
+from .service import get_rag_service
+from schema import ChatMessage, ChatResponse, SourceDocument
+
+# Logging is configured once by the application entry point
+logger = logging.getLogger(__name__)
+
+# Resolve the API key once at import instead of per instantiation
+_API_KEY = os.getenv("GOOGLE_API_KEY")
+
+# Keyword-to-topic mapping for conversation summaries, compiled into a
+# single regex once at import instead of lowercasing and scanning each
+# message repeatedly per keyword
+_KW_TO_TOPIC = {
+    "investment": "Investment and Property",
+    "property": "Investment and Property",
+    "token": "Investment and Property",
+    "account": "Account Setup",
+    "verification": "Account Setup",
+    "kyc": "Account Setup",
+    "payment": "Payment and Transactions",
+    "deposit": "Payment and Transactions",
+    "withdraw": "Payment and Transactions",
+    "help": "Support and Help",
+    "support": "Support and Help",
+    "problem": "Support and Help",
+}
+_TOPIC_RE = re.compile("|".join(_KW_TO_TOPIC), re.IGNORECASE)
+
+# Role-to-prefix table for rendering conversation history lines
+_ROLE_PREFIX = {
+    "user": "User: ",
+    "assistant": "Assistant: ",
+}
+
+# Static system prompt, identical for every request. It is wrapped in a
+# SystemMessage once at service construction; only the short dynamic tail
+# below is formatted per call
+_SYSTEM_PROMPT = """You are a helpful AI assistant for Brikkle, Nigeria's first blockchain-powered real estate investment platform.
+
+Your role is to help users understand:
+- How Brikkle works and its core value proposition
+- Investment opportunities and property tokenization
+- Account setup, verification, and payment processes
+- Property due diligence and investment strategies
+- Platform features, security, and compliance
+- Technical support and troubleshooting
+
+Guidelines:
+1. Always be helpful, accurate, and professional
+2. Use the provided context from Brikkle's knowledge base to answer questions
+3. If you don't have specific information, clearly state that and suggest contacting support
+4. Focus on Nigerian real estate investment context
+5. Explain complex blockchain and investment concepts in simple terms
+6. Always mention relevant minimum investment amounts, fees, and requirements
+7. Encourage users to verify information and do their own research"""
+
+# Per-request portion of the prompt, formatted with str.format_map
+_DYNAMIC_TEMPLATE = """Context from Brikkle Knowledge Base:
+{context}
+
+Previous conversation:
+{chat_history}
+
+User's question: {question}
+
+Please provide a helpful and accurate response based on the context above."""
+
+
+class ChatService:
+    """
+    Chat service that handles conversation management and response generation
+    using LangChain and Google Generative AI.
+    """
+    
+    def __init__(self, api_key: Optional[str] = None,):
+        """
+        Initialize the chat service.
+        
+        Args:
+            api_key: Google Generative AI API key (if not provided, will use env var)
+        """
+        self.api_key = api_key or _API_KEY
+        if not self.api_key:
+            raise ValueError("Google API key is required. Set GOOGLE_API_KEY environment variable.")
+        
+        # Initialize the language model
+        self.llm = ChatGoogleGenerativeAI(
+            model="gemini-1.5-flash",
+            google_api_key=self.api_key,
+            temperature=0.7,
+            max_output_tokens=2048
+        )
+        
+        # Initialize RAG service
+        self.rag_service = get_rag_service()
+        
+        # Build the static system message once; only the small dynamic
+        # tail is formatted per request
+        self._system_message = SystemMessage(content=_SYSTEM_PROMPT)
+
+        # Cap concurrent Gemini calls to respect per-minute quota limits
+        self._llm_semaphore = asyncio.Semaphore(int(os.getenv("LLM_CONCURRENCY", "8")))
+
+        # Optional exact-match response cache shared across workers.
+        # Enabled only when REDIS_URL is set and the client is installed
+        self._redis = None
+        self._redis_ttl = int(os.getenv("REDIS_CACHE_TTL", "3600"))
+        redis_url = os.getenv("REDIS_URL")
+        if redis_url and aioredis is not None:
+            try:
+                self._redis = aioredis.from_url(redis_url, decode_responses=True)
+                logger.info("Redis response cache enabled")
+            except Exception as e:
+                logger.warning("Redis response cache unavailable: %s", e)
+
+        logger.info("Chat service initialized successfully")
+    
+    def _build_messages(self,
+                        context: str,
+                        chat_history: str,
+                        question: str) -> List[Any]:
+        """
+        Build the message list for an LLM call: the shared static system
+        message plus a human message formatted from the dynamic tail.
+        """
+        return [
+            self._system_message,
+            HumanMessage(content=_DYNAMIC_TEMPLATE.format_map({
+                "context": context,
+                "chat_history": chat_history,
+                "question": question
+            }))
+        ]
+
+
+    def _format_chat_history(self, conversation_history: List[ChatMessage]) -> str:
+        """Format conversation history for the prompt."""
+        if not conversation_history:
+            return "No previous conversation."
+
+        # Keep only the last 5 messages for context to avoid token limits.
+        # A maxlen deque keeps just the tail without copying a slice of
+        # the full history; a single pass with a prefix table renders it
+        return "\n".join(
+            _ROLE_PREFIX[msg.role] + msg.content
+            for msg in deque(conversation_history, maxlen=5)
+            if msg.role in _ROLE_PREFIX
+        )
+    
+    def _format_context(self, source_docs: List[SourceDocument]) -> str:
+        """Format retrieved documents as context for the prompt."""
+        if not source_docs:
+            return "No relevant context found."
+        
+        context_parts = []
+        for i, doc in enumerate(source_docs, 1):
+            context_parts.append(f"Source {i} (Relevance: {doc.score:.2f}):\n{doc.content}\n")
+        
+        return "\n".join(context_parts)
+    
+    def _embed_and_retrieve(self, message: str) -> List[SourceDocument]:
+        """
+        Embed the new message and retrieve relevant documents with the
+        resulting vector. Only the message is embedded — retrieval never
+        uses the history vectors — and embed_query keeps the query task
+        type consistent with the rest of the serving path.
+        """
+        query_vector = self.rag_service.embedding_model.embed_query(message)
+
+        logger.info("Retrieving documents for query: %.50s...", message)
+        return self.rag_service.retrieve_documents(
+            query=message,
+            k=5,
+            score_threshold=0.6,
+            query_vector=query_vector
+        )
+
+    @staticmethod
+    def _response_cache_key(message: str,
+                            conversation_history: List[ChatMessage]) -> str:
+        """Derive a stable cache key from the message and its context."""
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(message.strip().lower().encode())
+        for msg in conversation_history:
+            digest.update(f"{msg.role}:{msg.content}".encode())
+        return f"brikkle:resp:{digest.hexdigest()}"
+
+    async def _aembed_and_retrieve(self, message: str) -> List[SourceDocument]:
+        """
+        Async counterpart of _embed_and_retrieve: the embedding call runs
+        in a worker thread and retrieval goes through the RAG service's
+        async interface.
+        """
+        query_vector = await asyncio.to_thread(
+            self.rag_service.embedding_model.embed_query, message
+        )
+
+        logger.info("Retrieving documents for query: %.50s...", message)
+        return await self.rag_service.aretrieve_documents(
+            query=message,
+            k=5,
+            score_threshold=0.6,
+            query_vector=query_vector
+        )
+
+    def generate_response(self,
+                         message: str,
+                         conversation_history: List[ChatMessage] = None,
+                         include_sources: bool = True) -> ChatResponse:
+        """
+        Generate a response to the user's message using RAG.
+        
+        Args:
+            message: User's message
+            conversation_history: Previous conversation messages (limited to last 5 for context)
+            include_sources: Whether to include source documents in response
+            
+        Returns:
+            ChatResponse with the generated message and sources
+        """
+        try:
+            # Embed and retrieve context for the message
+            source_docs = self._embed_and_retrieve(message)
+
+            # Format context and chat history
+            context = self._format_context(source_docs)
+            chat_history = self._format_chat_history(conversation_history or [])
+            
+            # Create the prompt messages
+            messages = self._build_messages(context, chat_history, message)
+
+            # Generate response
+            logger.info("Generating response with Google Generative AI...")
+            response = self.llm.invoke(messages)
+            
+            # Extract the response content
+            response_content = response.content if hasattr(response, 'content') else str(response)
+            
+            # Create the chat response
+            chat_response = ChatResponse(
+                message=response_content,
+                sources=source_docs if include_sources else None,
+                timestamp=datetime.now()
+            )
+            
+            logger.info("Response generated successfully")
+            return chat_response
+            
+        except Exception as e:
+            logger.error("Error generating response: %s", e)
+            # Return a fallback response
+            return ChatResponse(
+                message="I apologize, but I'm experiencing technical difficulties. Please try again later or contact Brikkle support for assistance.",
+                sources=None,
+                timestamp=datetime.now(),
+                cacheable=False
+            )
+    
+    async def agenerate_response(self,
+                                 message: str,
+                                 conversation_history: List[ChatMessage] = None,
+                                 include_sources: bool = True) -> ChatResponse:
+        """
+        Async variant of generate_response.
+
+        Blocking embedding/FAISS work runs in a worker thread and the LLM
+        call uses LangChain's async interface, so the event loop can
+        multiplex many in-flight Gemini requests instead of serializing
+        them. Concurrency is capped by the service's semaphore.
+        """
+        try:
+            source_docs = await self._aembed_and_retrieve(message)
+
+            messages = self._build_messages(
+                self._format_context(source_docs),
+                self._format_chat_history(conversation_history or []),
+                message
+            )
+
+            logger.info("Generating response with Google Generative AI...")
+            async with self._llm_semaphore:
+                response = await self.llm.ainvoke(messages)
+
+            response_content = response.content if hasattr(response, 'content') else str(response)
+
+            chat_response = ChatResponse(
+                message=response_content,
+                sources=source_docs if include_sources else None,
+                timestamp=datetime.now()
+            )
+
+            logger.info("Response generated successfully")
+            return chat_response
+
+        except Exception as e:
+            logger.error("Error generating response: %s", e)
+            # Return a fallback response
+            return ChatResponse(
+                message="I apologize, but I'm experiencing technical difficulties. Please try again later or contact Brikkle support for assistance.",
+                sources=None,
+                timestamp=datetime.now(),
+                cacheable=False
+            )
+
+    async def agenerate_response_batch(self, items: List[Dict[str, Any]]) -> List[ChatResponse]:
+        """
+        Async variant of generate_response_batch.
+
+        Embedding and the stacked FAISS search run in worker threads; the
+        prompts are dispatched through the LLM's async batch interface so
+        the Gemini calls for the whole batch are in flight concurrently.
+
+        Items with an exact-match hit in the shared Redis cache are
+        answered directly and drop out of the embed/retrieve/LLM pipeline.
+        """
+        try:
+            # One mget covers the whole batch; identical question plus
+            # identical context skips embedding, retrieval, and the LLM
+            cache_keys: List[Optional[str]] = [None] * len(items)
+            cached: List[Optional[str]] = [None] * len(items)
+            if self._redis is not None:
+                cache_keys = [
+                    self._response_cache_key(item["message"], item.get("history") or [])
+                    for item in items
+                ]
+                try:
+                    cached = await self._redis.mget(cache_keys)
+                except Exception as e:
+                    logger.warning("Redis cache read failed: %s", e)
+                    cached = [None] * len(items)
+
+            chat_responses: List[Optional[ChatResponse]] = [None] * len(items)
+            for i, cached_message in enumerate(cached):
+                if cached_message is not None:
+                    chat_responses[i] = ChatResponse(
+                        message=cached_message,
+                        sources=None,
+                        timestamp=datetime.now()
+                    )
+
+            pending = [i for i, response in enumerate(chat_responses) if response is None]
+            if not pending:
+                logger.info("Redis response cache hit for all %d request(s)", len(items))
+                return chat_responses
+            if len(pending) < len(items):
+                logger.info("Redis response cache hit for %d of %d request(s)",
+                            len(items) - len(pending), len(items))
+
+            # Reuse embeddings computed upstream (the route embeds each
+            # message for its semantic cache check); only embed messages
+            # that arrived without a vector
+            embeddings = [items[i].get("query_vector") for i in pending]
+            missing = [i for i, vector in enumerate(embeddings) if vector is None]
+            if missing:
+                fresh = await asyncio.to_thread(
+                    self.rag_service.embedding_model.embed_documents,
+                    [items[pending[i]]["message"] for i in missing]
+                )
+                for i, vector in zip(missing, fresh):
+                    embeddings[i] = vector
+            batch_sources = await asyncio.to_thread(
+                self.rag_service.retrieve_documents_batch, embeddings, 5, 0.6
+            )
+
+            prompts = [
+                self._build_messages(
+                    self._format_context(source_docs),
+                    self._format_chat_history(items[i].get("history") or []),
+                    items[i]["message"]
+                )
+                for i, source_docs in zip(pending, batch_sources)
+            ]
+
+            logger.info("Generating batch of %d response(s) with Google Generative AI...", len(prompts))
+
+            # One permit per Gemini call, same as agenerate_response, so
+            # LLM_CONCURRENCY caps total in-flight calls across batches
+            # rather than the number of in-flight batches
+            async def _invoke_one(prompt):
+                async with self._llm_semaphore:
+                    return await self.llm.ainvoke(prompt)
+
+            responses = await asyncio.gather(*(_invoke_one(prompt) for prompt in prompts))
+
+            for i, response, source_docs in zip(pending, responses, batch_sources):
+                response_content = response.content if hasattr(response, 'content') else str(response)
+                # Sources are always attached so the route can cache them;
+                # suppressing them for callers that didn't ask is the
+                # route's job, not the cache's
+                chat_responses[i] = ChatResponse(
+                    message=response_content,
+                    sources=source_docs,
+                    timestamp=datetime.now()
+                )
+                if self._redis is not None and cache_keys[i] is not None:
+                    try:
+                        await self._redis.setex(cache_keys[i], self._redis_ttl, response_content)
+                    except Exception as e:
+                        logger.warning("Redis cache write failed: %s", e)
+
+            logger.info("Batch responses generated successfully")
+            return chat_responses
+
+        except Exception as e:
+            logger.error("Error generating batch responses: %s", e)
+            fallback = ChatResponse(
+                message="I apologize, but I'm experiencing technical difficulties. Please try again later or contact Brikkle support for assistance.",
+                sources=None,
+                timestamp=datetime.now(),
+                cacheable=False
+            )
+            return [fallback for _ in items]
+
+    def generate_response_batch(self, items: List[Dict[str, Any]]) -> List[ChatResponse]:
+        """
+        Generate responses for a batch of coalesced requests.
+
+        Retrieval runs per item, but all prompts are dispatched to the
+        language model in a single batch call so that per-call overhead is
+        amortized across the requests collected by the dynamic batcher.
+
+        Args:
+            items: List of request dicts with "message" and "history" keys
+
+        Returns:
+            List of ChatResponse objects in the same order as items
+        """
+        try:
+            # Embed every message in the batch with one call, then search
+            # the FAISS index with the stacked query matrix in one call
+            embeddings = self.rag_service.embedding_model.embed_documents(
+                [item["message"] for item in items]
+            )
+            batch_sources = self.rag_service.retrieve_documents_batch(
+                embeddings,
+                k=5,
+                score_threshold=0.6
+            )
+
+            # Build one prompt per request
+            prompts = []
+            for item, source_docs in zip(items, batch_sources):
+                prompts.append(self._build_messages(
+                    self._format_context(source_docs),
+                    self._format_chat_history(item.get("history") or []),
+                    item["message"]
+                ))
+
+            # Generate all responses in a single batch call
+            logger.info("Generating batch of %d response(s) with Google Generative AI...", len(prompts))
+            responses = self.llm.batch(prompts)
+
+            chat_responses = []
+            for item, response, source_docs in zip(items, responses, batch_sources):
+                response_content = response.content if hasattr(response, 'content') else str(response)
+                # Sources are always attached; the caller decides whether
+                # to expose them
+                chat_responses.append(ChatResponse(
+                    message=response_content,
+                    sources=source_docs,
+                    timestamp=datetime.now()
+                ))
+
+            logger.info("Batch responses generated successfully")
+            return chat_responses
+
+        except Exception as e:
+            logger.error("Error generating batch responses: %s", e)
+            # Return a fallback response per request
+            fallback = ChatResponse(
+                message="I apologize, but I'm experiencing technical difficulties. Please try again later or contact Brikkle support for assistance.",
+                sources=None,
+                timestamp=datetime.now(),
+                cacheable=False
+            )
+            return [fallback for _ in items]
+
+    def get_conversation_summary(self, conversation_history: List[ChatMessage]) -> str:
+        """Generate a summary of the conversation."""
+        if not conversation_history:
+            return "No conversation history available."
+        
+        user_messages = [msg.content for msg in conversation_history if msg.role == "user"]
+        if not user_messages:
+            return "No user messages in conversation history."
+        
+        # Simple summary based on user messages; one precompiled regex
+        # pass per message instead of a lowercase + scan per keyword
+        topics = set()
+        for msg in user_messages:
+            for keyword in _TOPIC_RE.findall(msg):
+                topics.add(_KW_TO_TOPIC[keyword.lower()])
+
+        if topics:
+            return f"Conversation covered: {', '.join(topics)}"
+        else:
+            return "General conversation about Brikkle platform"
+
+
+# Global chat service instance
+chat_service = None
+
+
+def get_chat_service() -> ChatService:
+    """Get the global chat service instance."""
+    global chat_service
+    if chat_service is None:
+        chat_service = ChatService()
+    return chat_service
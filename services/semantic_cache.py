@@ -0,0 +1,238 @@
+"""
+Semantic response cache for the Brikkle chatbot.
+Caches generated responses keyed by message embedding so rephrased
+FAQ-style questions are served without the RAG + LLM pipeline.
+"""
+
+import asyncio
+import heapq
+import logging
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import faiss
+import numpy as np
+
+from schema import SourceDocument
+
+# Logging is configured once by the application entry point
+logger = logging.getLogger(__name__)
+
+
+class SemanticResponseCache:
+    """
+    Cache of (query embedding, response, sources) tuples backed by a FAISS
+    inner-product index. Embeddings are L2-normalized so inner product
+    equals cosine similarity. Entries expire after a TTL tracked with a
+    min-heap keyed on insertion time.
+    """
+
+    def __init__(self,
+                 embedding_model,
+                 similarity_threshold: float = 0.92,
+                 ttl_seconds: float = 3600.0,
+                 max_entries: int = 1024):
+        """
+        Initialize the semantic response cache.
+
+        Args:
+            embedding_model: Embedding model with an embed_query(text) method
+            similarity_threshold: Minimum cosine similarity for a cache hit
+            ttl_seconds: Time-to-live for cached entries in seconds
+            max_entries: Maximum number of live entries kept in the cache
+        """
+        self.embedding_model = embedding_model
+        self.similarity_threshold = similarity_threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+
+        # FAISS index is created lazily once the embedding dimension is
+        # known; the IDMap wrapper lets eviction remove vectors by id so
+        # the index never outgrows the entry dict
+        self.index: Optional[faiss.IndexIDMap2] = None
+
+        # Row id -> cached entry, kept in lockstep with the index
+        self._entries: Dict[int, Dict[str, Any]] = {}
+        self._expiry_heap: List[Tuple[float, int]] = []
+        self._next_row_id = 0
+
+        # Guard writes from concurrent request handlers
+        self._write_lock = asyncio.Lock()
+
+        self._hits = 0
+        self._misses = 0
+
+        logger.info("Semantic response cache initialized (threshold=%s, ttl=%ss)",
+                    similarity_threshold, ttl_seconds)
+
+    def embed_message(self, message: str) -> Optional[np.ndarray]:
+        """
+        Embed a message once for both the cache and downstream retrieval.
+
+        The raw vector is returned so callers can reuse it for the main
+        index search; the cache normalizes its own copy on lookup/add.
+
+        Args:
+            message: The message text to embed
+
+        Returns:
+            Raw float32 embedding vector, or None if embedding failed
+        """
+        try:
+            vector = np.asarray(self.embedding_model.embed_query(message), dtype=np.float32)
+            return vector.reshape(1, -1)
+        except Exception as e:
+            logger.error("Error embedding message for semantic cache: %s", e)
+            return None
+
+    @staticmethod
+    def _normalize(query_vector: np.ndarray) -> np.ndarray:
+        """L2-normalize a copy of the vector so inner product is cosine."""
+        vector = np.array(query_vector, dtype=np.float32, copy=True)
+        faiss.normalize_L2(vector)
+        return vector
+
+    def lookup(self,
+               query_vector: Optional[np.ndarray],
+               threshold: Optional[float] = None,
+               require_sources: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        Look up a cached response for the given query embedding.
+
+        Args:
+            query_vector: Raw query embedding from embed_message
+            threshold: Similarity threshold override (defaults to configured)
+            require_sources: Treat entries cached without sources as misses
+                so callers that asked for sources never get a sourceless hit
+
+        Returns:
+            Cached entry dict with "message" and "sources" keys, or None
+        """
+        try:
+            if query_vector is None or self.index is None or self.index.ntotal == 0:
+                self._misses += 1
+                return None
+
+            self._evict_expired()
+
+            threshold = threshold if threshold is not None else self.similarity_threshold
+            scores, row_ids = self.index.search(self._normalize(query_vector), 1)
+            score = float(scores[0][0])
+            row_id = int(row_ids[0][0])
+
+            entry = self._entries.get(row_id)
+            if entry is not None and score >= threshold:
+                if require_sources and entry["sources"] is None:
+                    self._misses += 1
+                    return None
+                self._hits += 1
+                logger.info("Semantic cache hit (similarity: %.3f)", score)
+                return entry
+
+            self._misses += 1
+            return None
+
+        except Exception as e:
+            logger.error("Error during semantic cache lookup: %s", e)
+            self._misses += 1
+            return None
+
+    async def add(self,
+                  query_vector: Optional[np.ndarray],
+                  message: str,
+                  response_message: str,
+                  sources: Optional[List[SourceDocument]] = None) -> bool:
+        """
+        Add a generated response to the cache.
+
+        Args:
+            query_vector: Raw query embedding from embed_message
+            message: Original user message
+            response_message: Generated response text
+            sources: Source documents used for the response
+
+        Returns:
+            True if the entry was cached, False otherwise
+        """
+        if query_vector is None:
+            return False
+
+        async with self._write_lock:
+            try:
+                if self.index is None:
+                    self.index = faiss.IndexIDMap2(
+                        faiss.IndexFlatIP(query_vector.shape[1])
+                    )
+
+                self._evict_expired()
+                while len(self._entries) >= self.max_entries:
+                    self._evict_oldest()
+
+                row_id = self._next_row_id
+                self.index.add_with_ids(
+                    self._normalize(query_vector),
+                    np.asarray([row_id], dtype=np.int64)
+                )
+                self._next_row_id += 1
+
+                timestamp = time.monotonic()
+                self._entries[row_id] = {
+                    "message": response_message,
+                    "sources": sources,
+                    "query": message,
+                    "ts": timestamp
+                }
+                heapq.heappush(self._expiry_heap, (timestamp, row_id))
+                return True
+
+            except Exception as e:
+                logger.error("Error adding entry to semantic cache: %s", e)
+                return False
+
+    def _evict_expired(self) -> None:
+        """Evict entries whose TTL has elapsed."""
+        now = time.monotonic()
+        while self._expiry_heap and now - self._expiry_heap[0][0] > self.ttl_seconds:
+            _, row_id = heapq.heappop(self._expiry_heap)
+            if self._entries.pop(row_id, None) is not None:
+                self._remove_row(row_id)
+
+    def _evict_oldest(self) -> None:
+        """Evict the oldest entry to make room for a new one."""
+        while self._expiry_heap:
+            _, row_id = heapq.heappop(self._expiry_heap)
+            if self._entries.pop(row_id, None) is not None:
+                self._remove_row(row_id)
+                return
+
+    def _remove_row(self, row_id: int) -> None:
+        """Drop an evicted vector from the index so the k=1 search never
+        lands on a dead row."""
+        if self.index is not None:
+            self.index.remove_ids(np.asarray([row_id], dtype=np.int64))
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get statistics about the semantic cache."""
+        return {
+            "live_entries": len(self._entries),
+            "indexed_vectors": self.index.ntotal if self.index else 0,
+            "hits": self._hits,
+            "misses": self._misses,
+            "similarity_threshold": self.similarity_threshold,
+            "ttl_seconds": self.ttl_seconds
+        }
+
+
+# Global semantic cache instance
+semantic_cache = None
+
+
+def get_semantic_cache() -> SemanticResponseCache:
+    """Get the global semantic response cache instance."""
+    global semantic_cache
+    if semantic_cache is None:
+        from .service import get_rag_service
+        semantic_cache = SemanticResponseCache(
+            embedding_model=get_rag_service().embedding_model
+        )
+    return semantic_cache
@@ -1,233 +1,497 @@
-"""
-RAG (Retrieval-Augmented Generation) service for the Brikkle chatbot.
-Handles document embedding, FAISS vector store, and document retrieval.
-"""
-
-import os
-import logging
-from typing import List, Dict, Any, Optional
-from pathlib import Path
-
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.schema import Document
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
-from langchain_community.vectorstores import FAISS
-
-from schema import SourceDocument
-
-# Configure logging
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
-
-
-class RAGService:
-    """
-    RAG service that handles document embedding, FAISS vector store,
-    and document retrieval for the Brikkle knowledge base.
-    """
-    
-    def __init__(self, 
-                 data_file_path: str = "data/data.txt",
-                 vectorstore_path: str = "data/faiss_vectorstore",
-                 api_key: Optional[str] = None,
-                 embedding_model: str = "models/embedding-001"):
-        """
-        Initialize the RAG service.
-        
-        Args:
-            data_file_path: Path to the knowledge base text file
-            vectorstore_path: Path to save/load FAISS vectorstore
-            api_key: Google API key (if not provided, will use env var)
-            embedding_model: Name of the Google embedding model
-        """
-        self.data_file_path = data_file_path
-        self.vectorstore_path = vectorstore_path
-        self.embedding_model_name = embedding_model
-        
-        # Get API key
-        self.api_key = api_key or os.getenv("GOOGLE_API_KEY")
-        if not self.api_key:
-            raise ValueError("Google API key is required. Set GOOGLE_API_KEY environment variable.")
-        
-        # Initialize components
-        self.embedding_model = GoogleGenerativeAIEmbeddings(
-            model=embedding_model,
-            google_api_key=self.api_key
-        )
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=200,
-            length_function=len,
-            separators=["\n\n", "\n", ". ", " ", ""]
-        )
-        
-        # Initialize vectorstore
-        self.vectorstore = None
-        
-        # Load or create vector store
-        self._initialize_vector_store()
-    
-    def _initialize_vector_store(self) -> None:
-        """Initialize the FAISS vector store, loading existing or creating new."""
-        try:
-            if self._vector_store_exists():
-                logger.info("Loading existing FAISS vector store...")
-                self._load_vector_store()
-            else:
-                logger.info("Creating new FAISS vector store...")
-                self._create_vector_store()
-        except Exception as e:
-            logger.error(f"Error initializing vector store: {e}")
-            raise
-    
-    def _vector_store_exists(self) -> bool:
-        """Check if FAISS vectorstore directory exists."""
-        return os.path.exists(self.vectorstore_path) and os.path.isdir(self.vectorstore_path)
-    
-    def _load_vector_store(self) -> None:
-        """Load existing FAISS vectorstore."""
-        try:
-            self.vectorstore = FAISS.load_local(
-                self.vectorstore_path, 
-                self.embedding_model,
-                allow_dangerous_deserialization=True
-            )
-            logger.info(f"Loaded vector store with {self.vectorstore.index.ntotal} documents")
-            
-        except Exception as e:
-            logger.error(f"Error loading vector store: {e}")
-            # If loading fails, create a new one
-            logger.info("Creating new vector store due to loading error...")
-            self._create_vector_store()
-    
-    def _create_vector_store(self) -> None:
-        """Create new FAISS vector store from the knowledge base."""
-        try:
-            # Read and process the knowledge base
-            documents = self._load_and_split_documents()
-            
-            if not documents:
-                raise ValueError("No documents found in the knowledge base")
-            
-            # Create FAISS vectorstore from documents
-            logger.info("Creating FAISS vectorstore from documents...")
-            self.vectorstore = FAISS.from_documents(
-                documents=documents,
-                embedding=self.embedding_model
-            )
-            
-            # Save to disk
-            self._save_vector_store()
-            
-            logger.info(f"Created vector store with {len(documents)} documents")
-            
-        except Exception as e:
-            logger.error(f"Error creating vector store: {e}")
-            raise
-    
-    def _load_and_split_documents(self) -> List[Document]:
-        """Load and split the knowledge base document."""
-        try:
-            with open(self.data_file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-            
-            # Create a single document
-            doc = Document(
-                page_content=content,
-                metadata={"source": self.data_file_path, "title": "Brikkle Knowledge Base"}
-            )
-            
-            # Split into chunks
-            documents = self.text_splitter.split_documents([doc])
-            
-            # Add metadata to each chunk
-            for i, doc in enumerate(documents):
-                doc.metadata.update({
-                    "chunk_id": i,
-                    "chunk_size": len(doc.page_content)
-                })
-            
-            return documents
-            
-        except Exception as e:
-            logger.error(f"Error loading documents: {e}")
-            raise
-    
-    def _save_vector_store(self) -> None:
-        """Save FAISS vectorstore to disk."""
-        try:
-            # Ensure directory exists
-            os.makedirs(self.vectorstore_path, exist_ok=True)
-            
-            # Save FAISS vectorstore
-            self.vectorstore.save_local(self.vectorstore_path)
-            
-            logger.info("Vector store saved successfully")
-            
-        except Exception as e:
-            logger.error(f"Error saving vector store: {e}")
-            raise
-    
-    def retrieve_documents(self, 
-                          query: str, 
-                          k: int = 5, 
-                          score_threshold: float = 0.7) -> List[SourceDocument]:
-        """
-        Retrieve relevant documents for a given query.
-        
-        Args:
-            query: The search query
-            k: Number of documents to retrieve
-            score_threshold: Minimum similarity score threshold
-            
-        Returns:
-            List of relevant source documents
-        """
-        try:
-            if self.vectorstore is None:
-                raise ValueError("Vector store not initialized")
-            
-            # Search using LangChain FAISS similarity search with scores
-            docs_with_scores = self.vectorstore.similarity_search_with_score(query, k=k)
-            
-            # Filter by score threshold and create source documents
-            source_docs = []
-            for doc, score in docs_with_scores:
-                # FAISS returns distance scores (lower is better), convert to similarity
-                similarity_score = 1 / (1 + score) if score > 0 else 1.0
-                
-                if similarity_score >= score_threshold:
-                    source_doc = SourceDocument(
-                        content=doc.page_content,
-                        metadata=doc.metadata,
-                        score=float(similarity_score)
-                    )
-                    source_docs.append(source_doc)
-            
-            logger.info(f"Retrieved {len(source_docs)} documents for query: {query[:50]}...")
-            return source_docs
-            
-        except Exception as e:
-            logger.error(f"Error retrieving documents: {e}")
-            return []
-    
-    def get_stats(self) -> Dict[str, Any]:
-        """Get statistics about the vector store."""
-        return {
-            "total_documents": self.vectorstore.index.ntotal if self.vectorstore else 0,
-            "embedding_dimension": self.vectorstore.index.d if self.vectorstore else 0,
-            "model_name": self.embedding_model_name,
-            "index_type": "LangChain FAISS"
-        }
-
-
-# Global RAG service instance
-rag_service = None
-
-
-def get_rag_service() -> RAGService:
-    """Get the global RAG service instance."""
-    global rag_service
-    if rag_service is None:
-        rag_service = RAGService()
-    return rag_service
+"""
+RAG (Retrieval-Augmented Generation) service for the Brikkle chatbot.
+Handles document embedding, FAISS vector store, and document retrieval.
+"""
+
+import asyncio
+import os
+import logging
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional
+from pathlib import Path
+
+import faiss
+import numpy as np
+from langchain.embeddings import CacheBackedEmbeddings
+from langchain.storage import LocalFileStore
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain.schema import Document
+from langchain_google_genai import GoogleGenerativeAIEmbeddings
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+
+from schema import SourceDocument
+
+# Logging is configured once by the application entry point
+logger = logging.getLogger(__name__)
+
+# Resolve the API key once at import instead of per instantiation
+_API_KEY = os.getenv("GOOGLE_API_KEY")
+
+
+class RAGService:
+    """
+    RAG service that handles document embedding, FAISS vector store,
+    and document retrieval for the Brikkle knowledge base.
+    """
+    
+    def __init__(self, 
+                 data_file_path: str = "data/data.txt",
+                 vectorstore_path: str = "data/faiss_vectorstore",
+                 api_key: Optional[str] = None,
+                 embedding_model: str = "models/embedding-001"):
+        """
+        Initialize the RAG service.
+        
+        Args:
+            data_file_path: Path to the knowledge base text file
+            vectorstore_path: Path to save/load FAISS vectorstore
+            api_key: Google API key (if not provided, will use env var)
+            embedding_model: Name of the Google embedding model
+        """
+        self.data_file_path = data_file_path
+        self.vectorstore_path = vectorstore_path
+        self.embedding_model_name = embedding_model
+        
+        # Get API key
+        self.api_key = api_key or _API_KEY
+        if not self.api_key:
+            raise ValueError("Google API key is required. Set GOOGLE_API_KEY environment variable.")
+        
+        # Initialize components. Document embeddings are cached on disk so
+        # cold rebuilds (missing or corrupted index) re-read local bytes
+        # instead of re-calling the embedding API for every chunk; query
+        # embedding passes through to the underlying model uncached
+        underlying_embeddings = GoogleGenerativeAIEmbeddings(
+            model=embedding_model,
+            google_api_key=self.api_key
+        )
+        self.embedding_model = CacheBackedEmbeddings.from_bytes_store(
+            underlying_embeddings,
+            LocalFileStore("data/emb_cache"),
+            namespace=embedding_model
+        )
+
+        # Initialize vectorstore
+        self.vectorstore = None
+
+        # Semantic query cache: normalized embeddings of recent queries
+        # mapped to their retrieval results, so near-duplicate questions
+        # skip both the embedding round-trip and the vector search
+        self._query_cache_index = None
+        self._query_cache_entries: Dict[int, Dict[str, Any]] = {}
+        self._query_cache_order: deque = deque()
+        self._query_cache_next_id = 0
+        self._query_cache_threshold = 0.95
+        self._query_cache_max_entries = 1024
+        self._query_cache_ttl = 3600.0
+
+        # Let batched FAISS searches fan out across cores
+        faiss.omp_set_num_threads(min(os.cpu_count() or 1, 8))
+
+        # Load or create vector store
+        self._initialize_vector_store()
+    
+    def _initialize_vector_store(self) -> None:
+        """Initialize the FAISS vector store, loading existing or creating new."""
+        try:
+            if self._vector_store_exists():
+                logger.info("Loading existing FAISS vector store...")
+                self._load_vector_store()
+            else:
+                logger.info("Creating new FAISS vector store...")
+                self._create_vector_store()
+        except Exception as e:
+            logger.error("Error initializing vector store: %s", e)
+            raise
+    
+    def _vector_store_exists(self) -> bool:
+        """Check if FAISS vectorstore directory exists."""
+        return os.path.exists(self.vectorstore_path) and os.path.isdir(self.vectorstore_path)
+    
+    def _load_vector_store(self) -> None:
+        """Load existing FAISS vectorstore."""
+        try:
+            self.vectorstore = FAISS.load_local(
+                self.vectorstore_path, 
+                self.embedding_model,
+                allow_dangerous_deserialization=True
+            )
+            logger.info("Loaded vector store with %d documents", self.vectorstore.index.ntotal)
+            
+        except Exception as e:
+            logger.error("Error loading vector store: %s", e)
+            # If loading fails, create a new one
+            logger.info("Creating new vector store due to loading error...")
+            self._create_vector_store()
+    
+    def _create_vector_store(self) -> None:
+        """Create new FAISS vector store from the knowledge base."""
+        try:
+            # Read and process the knowledge base
+            documents = self._load_and_split_documents()
+            
+            if not documents:
+                raise ValueError("No documents found in the knowledge base")
+
+            texts = [doc.page_content for doc in documents]
+            metadatas = [doc.metadata for doc in documents]
+
+            # Embed chunks up front (in parallel batches where possible)
+            # and build the vectorstore from the precomputed vectors
+            logger.info("Creating FAISS vectorstore from documents...")
+            vectors = self._embed_texts(texts)
+
+            # Build an HNSW graph index instead of the default flat index:
+            # search cost is sub-linear in corpus size, so retrieval stays
+            # fast as the knowledge base grows. efSearch trades a little
+            # recall for speed at query time; efConstruction only affects
+            # the one-off build. Vectors are stored 8-bit scalar-quantized,
+            # cutting the in-memory footprint to roughly a quarter of
+            # float32 with negligible recall loss at this corpus size
+            vector_matrix = np.asarray(vectors, dtype=np.float32)
+            dimension = vector_matrix.shape[1]
+            index = faiss.IndexHNSWSQ(dimension, faiss.ScalarQuantizer.QT_8bit, 32)
+            index.hnsw.efConstruction = 200
+            index.hnsw.efSearch = 64
+            index.train(vector_matrix)
+
+            self.vectorstore = FAISS(
+                embedding_function=self.embedding_model,
+                index=index,
+                docstore=InMemoryDocstore({}),
+                index_to_docstore_id={}
+            )
+            self.vectorstore.add_embeddings(
+                list(zip(texts, vectors)),
+                metadatas=metadatas
+            )
+
+            # Save to disk
+            self._save_vector_store()
+
+            logger.info("Created vector store with %d documents", len(documents))
+
+        except Exception as e:
+            logger.error("Error creating vector store: %s", e)
+            raise
+
+    def _embed_texts(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed texts for the vector store build, preferring parallel async
+        batches and falling back to the serial API when that fails (e.g.
+        the async embedding interface is unavailable).
+        """
+        try:
+            try:
+                asyncio.get_running_loop()
+            except RuntimeError:
+                # No running loop (plain script / worker thread)
+                return asyncio.run(self._parallel_embed(texts))
+
+            # Called from inside a running loop — the usual case, since the
+            # index is built during the async application lifespan. asyncio.run
+            # would raise here, so drive the parallel embed on a fresh loop in
+            # a worker thread and block this (already offloaded) caller on it
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                return executor.submit(
+                    asyncio.run, self._parallel_embed(texts)
+                ).result()
+        except Exception as e:
+            logger.warning("Parallel embedding unavailable, embedding serially: %s", e)
+            return self.embedding_model.embed_documents(texts)
+
+    async def _parallel_embed(self,
+                              texts: List[str],
+                              batch_size: int = 100,
+                              parallelism: int = 8) -> List[List[float]]:
+        """Embed texts in concurrent batches bounded by a semaphore."""
+        semaphore = asyncio.Semaphore(parallelism)
+
+        async def embed_batch(batch: List[str]) -> List[List[float]]:
+            async with semaphore:
+                return await self.embedding_model.aembed_documents(batch)
+
+        batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+        results = await asyncio.gather(*(embed_batch(batch) for batch in batches))
+        return [vector for batch_vectors in results for vector in batch_vectors]
+    
+    def _load_and_split_documents(self) -> List[Document]:
+        """Load and split the knowledge base document."""
+        try:
+            with open(self.data_file_path, 'r', encoding='utf-8') as f:
+                content = f.read()
+            
+            # Create a single document
+            doc = Document(
+                page_content=content,
+                metadata={"source": self.data_file_path, "title": "Brikkle Knowledge Base"}
+            )
+            
+            # Split into chunks. The splitter is only needed for index
+            # builds, so it lives here rather than on every service
+            # instance that merely loads an existing index
+            text_splitter = RecursiveCharacterTextSplitter(
+                chunk_size=1000,
+                chunk_overlap=200,
+                length_function=len,
+                separators=["\n\n", "\n", ". ", " ", ""]
+            )
+            documents = text_splitter.split_documents([doc])
+            
+            # Add metadata to each chunk
+            for i, doc in enumerate(documents):
+                doc.metadata.update({
+                    "chunk_id": i,
+                    "chunk_size": len(doc.page_content)
+                })
+            
+            return documents
+            
+        except Exception as e:
+            logger.error("Error loading documents: %s", e)
+            raise
+    
+    def _save_vector_store(self) -> None:
+        """Save FAISS vectorstore to disk."""
+        try:
+            # Ensure directory exists
+            os.makedirs(self.vectorstore_path, exist_ok=True)
+            
+            # Save FAISS vectorstore
+            self.vectorstore.save_local(self.vectorstore_path)
+            
+            logger.info("Vector store saved successfully")
+            
+        except Exception as e:
+            logger.error("Error saving vector store: %s", e)
+            raise
+    
+    def retrieve_documents(self,
+                          query: str,
+                          k: int = 5,
+                          score_threshold: float = 0.7,
+                          query_vector: Optional[List[float]] = None) -> List[SourceDocument]:
+        """
+        Retrieve relevant documents for a given query.
+
+        Args:
+            query: The search query
+            k: Number of documents to retrieve
+            score_threshold: Minimum similarity score threshold
+            query_vector: Precomputed query embedding; when provided the
+                query is not re-embedded
+
+        Returns:
+            List of relevant source documents
+        """
+        try:
+            if self.vectorstore is None:
+                raise ValueError("Vector store not initialized")
+
+            # Embed the query once (unless the caller already did) so the
+            # same vector serves both the cache lookup and the ANN search
+            if query_vector is None:
+                query_vector = self.embedding_model.embed_query(query)
+
+            cached_docs = self._query_cache_lookup(query_vector, k, score_threshold)
+            if cached_docs is not None:
+                logger.info("Query cache hit for: %.50s...", query)
+                return cached_docs
+
+            docs_with_scores = self.vectorstore.similarity_search_with_score_by_vector(
+                query_vector, k=k
+            )
+            
+            # FAISS returns distance scores (lower is better); convert the
+            # whole result row to similarities in one vectorized expression
+            distances = np.fromiter(
+                (score for _, score in docs_with_scores),
+                dtype=np.float32,
+                count=len(docs_with_scores)
+            )
+            similarities = np.where(distances > 0, 1.0 / (1.0 + distances), 1.0)
+
+            # Filter by score threshold and create source documents
+            source_docs = [
+                SourceDocument(
+                    content=doc.page_content,
+                    metadata=doc.metadata,
+                    score=float(similarity)
+                )
+                for (doc, _), similarity in zip(docs_with_scores, similarities)
+                if similarity >= score_threshold
+            ]
+            
+            self._query_cache_add(query_vector, query, source_docs, k, score_threshold)
+
+            logger.info("Retrieved %d documents for query: %.50s...", len(source_docs), query)
+            return source_docs
+
+        except Exception as e:
+            logger.error("Error retrieving documents: %s", e)
+            return []
+
+    async def aretrieve_documents(self,
+                                  query: str,
+                                  k: int = 5,
+                                  score_threshold: float = 0.7,
+                                  query_vector: Optional[List[float]] = None) -> List[SourceDocument]:
+        """
+        Async variant of retrieve_documents. The blocking embedding call
+        and FAISS search run in a worker thread so callers on the event
+        loop are not stalled.
+        """
+        return await asyncio.to_thread(
+            self.retrieve_documents, query, k, score_threshold, query_vector
+        )
+
+    def _normalize_query_vector(self, query_vector: List[float]) -> np.ndarray:
+        """L2-normalize a query vector so inner product equals cosine."""
+        vector = np.asarray(query_vector, dtype=np.float32).reshape(1, -1)
+        faiss.normalize_L2(vector)
+        return vector
+
+    def _query_cache_lookup(self,
+                            query_vector: List[float],
+                            k: int,
+                            score_threshold: float) -> Optional[List[SourceDocument]]:
+        """
+        Return cached retrieval results for a semantically equivalent query,
+        or None. Only entries retrieved with the same k and threshold and
+        within the TTL are eligible.
+        """
+        try:
+            if self._query_cache_index is None or self._query_cache_index.ntotal == 0:
+                return None
+
+            vector = self._normalize_query_vector(query_vector)
+            scores, cache_ids = self._query_cache_index.search(vector, 1)
+            if float(scores[0][0]) < self._query_cache_threshold:
+                return None
+
+            entry = self._query_cache_entries.get(int(cache_ids[0][0]))
+            if entry is None:
+                return None
+            if entry["k"] != k or entry["score_threshold"] != score_threshold:
+                return None
+            if time.monotonic() - entry["ts"] > self._query_cache_ttl:
+                return None
+
+            return entry["source_docs"]
+
+        except Exception as e:
+            logger.error("Error during query cache lookup: %s", e)
+            return None
+
+    def _query_cache_add(self,
+                         query_vector: List[float],
+                         query: str,
+                         source_docs: List[SourceDocument],
+                         k: int,
+                         score_threshold: float) -> None:
+        """Cache retrieval results for a query, evicting FIFO when full."""
+        try:
+            vector = self._normalize_query_vector(query_vector)
+
+            if self._query_cache_index is None:
+                self._query_cache_index = faiss.IndexIDMap2(
+                    faiss.IndexFlatIP(vector.shape[1])
+                )
+
+            while len(self._query_cache_entries) >= self._query_cache_max_entries:
+                oldest_id = self._query_cache_order.popleft()
+                self._query_cache_entries.pop(oldest_id, None)
+                self._query_cache_index.remove_ids(np.asarray([oldest_id], dtype=np.int64))
+
+            cache_id = self._query_cache_next_id
+            self._query_cache_next_id += 1
+            self._query_cache_index.add_with_ids(vector, np.asarray([cache_id], dtype=np.int64))
+            self._query_cache_entries[cache_id] = {
+                "query": query,
+                "source_docs": source_docs,
+                "k": k,
+                "score_threshold": score_threshold,
+                "ts": time.monotonic()
+            }
+            self._query_cache_order.append(cache_id)
+
+        except Exception as e:
+            logger.error("Error adding entry to query cache: %s", e)
+
+    def retrieve_documents_batch(self,
+                                 query_vectors: List[List[float]],
+                                 k: int = 5,
+                                 score_threshold: float = 0.7) -> List[List[SourceDocument]]:
+        """
+        Retrieve relevant documents for a batch of precomputed query vectors.
+
+        All queries are stacked into one matrix and searched with a single
+        FAISS call, which is substantially faster than vector-at-a-time
+        searches thanks to cache locality and BLAS reuse.
+
+        Args:
+            query_vectors: Precomputed query embeddings
+            k: Number of documents to retrieve per query
+            score_threshold: Minimum similarity score threshold
+
+        Returns:
+            One list of source documents per query, in input order
+        """
+        try:
+            if self.vectorstore is None:
+                raise ValueError("Vector store not initialized")
+
+            queries = np.ascontiguousarray(np.asarray(query_vectors, dtype=np.float32))
+            distances, indices = self.vectorstore.index.search(queries, k)
+
+            results = []
+            for row_distances, row_indices in zip(distances, indices):
+                source_docs = []
+                for distance, index in zip(row_distances, row_indices):
+                    if index == -1:
+                        continue
+
+                    # FAISS returns distance scores (lower is better), convert to similarity
+                    similarity_score = 1 / (1 + distance) if distance > 0 else 1.0
+                    if similarity_score < score_threshold:
+                        continue
+
+                    doc_id = self.vectorstore.index_to_docstore_id[int(index)]
+                    doc = self.vectorstore.docstore.search(doc_id)
+                    source_docs.append(SourceDocument(
+                        content=doc.page_content,
+                        metadata=doc.metadata,
+                        score=float(similarity_score)
+                    ))
+                results.append(source_docs)
+
+            logger.info("Retrieved documents for batch of %d queries", len(results))
+            return results
+
+        except Exception as e:
+            logger.error("Error retrieving documents for batch: %s", e)
+            return [[] for _ in query_vectors]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get statistics about the vector store."""
+        return {
+            "total_documents": self.vectorstore.index.ntotal if self.vectorstore else 0,
+            "embedding_dimension": self.vectorstore.index.d if self.vectorstore else 0,
+            "model_name": self.embedding_model_name,
+            "index_type": "LangChain FAISS"
+        }
+
+
+# Global RAG service instance
+rag_service = None
+
+
+def get_rag_service() -> RAGService:
+    """Get the global RAG service instance."""
+    global rag_service
+    if rag_service is None:
+        rag_service = RAGService()
+    return rag_service
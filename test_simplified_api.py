@@ -1,237 +1,303 @@
-#!/usr/bin/env python3
-"""
-Test script for the simplified Brikkle chatbot API.
-Tests the single chat endpoint with automatic session management.
-"""
-
-import requests
-import json
-import time
-from typing import Dict, Any
-
-# Configuration
-API_BASE_URL = "http://localhost:8000/api/v1"
-TEST_MESSAGES = [
-    "Hello, what is Brikkle?",
-    "How do I invest in real estate through Brikkle?",
-    "What are the minimum investment amounts?",
-    "How does property tokenization work?",
-    "What fees are involved?"
-]
-
-def test_health_check():
-    """Test the health check endpoint."""
-    print("🔍 Testing health check...")
-    try:
-        response = requests.get(f"{API_BASE_URL}/health")
-        if response.status_code == 200:
-            data = response.json()
-            print(f"✅ Health check passed: {data['status']}")
-            return True
-        else:
-            print(f"❌ Health check failed: {response.status_code}")
-            return False
-    except Exception as e:
-        print(f"❌ Health check error: {e}")
-        return False
-
-def test_chat_endpoint():
-    """Test the simplified chat endpoint with session management."""
-    print("\n💬 Testing chat endpoint with session management...")
-    
-    session_id = None
-    
-    for i, message in enumerate(TEST_MESSAGES, 1):
-        print(f"\n--- Test {i}: {message[:50]}... ---")
-        
-        # Prepare request
-        request_data = {
-            "message": message,
-            "include_sources": False
-        }
-        
-        # Add session_id if we have one (for continuation)
-        if session_id:
-            request_data["session_id"] = session_id
-        
-        try:
-            # Send request
-            response = requests.post(
-                f"{API_BASE_URL}/chat",
-                json=request_data,
-                headers={"Content-Type": "application/json"}
-            )
-            
-            if response.status_code == 200:
-                data = response.json()
-                
-                # Extract session_id for next request
-                if "session_id" in data:
-                    session_id = data["session_id"]
-                    print(f"📝 Session ID: {session_id[:8]}...")
-                
-                print(f"🤖 Bot Response: {data['message'][:100]}...")
-                print(f"⏰ Timestamp: {data['timestamp']}")
-                
-                if data.get('sources'):
-                    print(f"📚 Sources: {len(data['sources'])} documents")
-                
-            else:
-                print(f"❌ Request failed: {response.status_code}")
-                print(f"Error: {response.text}")
-                return False
-                
-        except Exception as e:
-            print(f"❌ Request error: {e}")
-            return False
-        
-        # Small delay between requests
-        time.sleep(1)
-    
-    print(f"\n✅ All chat tests passed! Final session ID: {session_id[:8] if session_id else 'None'}...")
-    return True
-
-def test_stats_endpoint():
-    """Test the stats endpoint."""
-    print("\n📊 Testing stats endpoint...")
-    try:
-        response = requests.get(f"{API_BASE_URL}/stats")
-        if response.status_code == 200:
-            data = response.json()
-            print(f"✅ Stats retrieved successfully")
-            print(f"📈 RAG Service Status: {data['status']}")
-            if 'rag_service' in data:
-                rag_stats = data['rag_service']
-                print(f"📄 Total Documents: {rag_stats.get('total_documents', 'N/A')}")
-                print(f"🔍 Vector Store Size: {rag_stats.get('vector_store_size', 'N/A')}")
-            return True
-        else:
-            print(f"❌ Stats request failed: {response.status_code}")
-            return False
-    except Exception as e:
-        print(f"❌ Stats error: {e}")
-        return False
-
-def test_new_session_creation():
-    """Test that a new session is created when no session_id is provided."""
-    print("\n🆕 Testing new session creation...")
-    
-    try:
-        # First request without session_id
-        request_data = {
-            "message": "Hello, I'm starting a new conversation",
-            "include_sources": False
-        }
-        
-        response = requests.post(
-            f"{API_BASE_URL}/chat",
-            json=request_data,
-            headers={"Content-Type": "application/json"}
-        )
-        
-        if response.status_code == 200:
-            data = response.json()
-            session_id = data.get("session_id")
-            
-            if session_id:
-                print(f"✅ New session created: {session_id[:8]}...")
-                
-                # Second request with the same session_id to test continuation
-                request_data["session_id"] = session_id
-                request_data["message"] = "This is a follow-up message in the same session"
-                
-                response2 = requests.post(
-                    f"{API_BASE_URL}/chat",
-                    json=request_data,
-                    headers={"Content-Type": "application/json"}
-                )
-                
-                if response2.status_code == 200:
-                    data2 = response2.json()
-                    if data2.get("session_id") == session_id:
-                        print(f"✅ Session continuation works: {session_id[:8]}...")
-                        
-                        # Third request to test that context is maintained (last 5 messages)
-                        request_data["message"] = "What was my previous question?"
-                        response3 = requests.post(
-                            f"{API_BASE_URL}/chat",
-                            json=request_data,
-                            headers={"Content-Type": "application/json"}
-                        )
-                        
-                        if response3.status_code == 200:
-                            data3 = response3.json()
-                            if data3.get("session_id") == session_id:
-                                print(f"✅ Context maintained across multiple messages: {session_id[:8]}...")
-                                return True
-                            else:
-                                print(f"❌ Session ID changed on third request")
-                                return False
-                        else:
-                            print(f"❌ Third request failed: {response3.status_code}")
-                            return False
-                    else:
-                        print(f"❌ Session ID changed unexpectedly")
-                        return False
-                else:
-                    print(f"❌ Second request failed: {response2.status_code}")
-                    return False
-            else:
-                print(f"❌ No session_id returned")
-                return False
-        else:
-            print(f"❌ First request failed: {response.status_code}")
-            return False
-            
-    except Exception as e:
-        print(f"❌ Session creation test error: {e}")
-        return False
-
-def main():
-    """Run all tests."""
-    print("🚀 Starting Brikkle Chatbot API Tests")
-    print("=" * 50)
-    
-    tests = [
-        ("Health Check", test_health_check),
-        ("Chat Endpoint", test_chat_endpoint),
-        ("Stats Endpoint", test_stats_endpoint),
-        ("Session Management", test_new_session_creation)
-    ]
-    
-    results = []
-    
-    for test_name, test_func in tests:
-        try:
-            result = test_func()
-            results.append((test_name, result))
-        except Exception as e:
-            print(f"❌ {test_name} crashed: {e}")
-            results.append((test_name, False))
-    
-    # Summary
-    print("\n" + "=" * 50)
-    print("📋 TEST SUMMARY")
-    print("=" * 50)
-    
-    passed = 0
-    total = len(results)
-    
-    for test_name, result in results:
-        status = "✅ PASSED" if result else "❌ FAILED"
-        print(f"{test_name}: {status}")
-        if result:
-            passed += 1
-    
-    print(f"\n🎯 Results: {passed}/{total} tests passed")
-    
-    if passed == total:
-        print("🎉 All tests passed! The simplified API is working correctly.")
-    else:
-        print("⚠️  Some tests failed. Please check the server and try again.")
-    
-    return passed == total
-
-if __name__ == "__main__":
-    success = main()
-    exit(0 if success else 1)
+#!/usr/bin/env python3
+"""
+Tests for the simplified Brikkle chatbot API against a running server.
+
+Run with pytest after starting the server (`python app.py`); the suite
+skips itself when the server is unreachable. Independent tests can be
+spread across workers with pytest-xdist (`pytest -n auto`).
+"""
+
+import asyncio
+import os
+import sys
+from typing import Dict, Any, List
+
+import httpx
+import orjson
+import pytest
+
+# diskcache is optional; without it the idempotent GETs always hit the
+# network (the behavior CI wants anyway)
+try:
+    from diskcache import Cache
+    CACHE = Cache(".brikkle_test_cache")
+except ImportError:
+    CACHE = None
+
+# Configuration
+API_BASE_URL = "http://localhost:8000/api/v1"
+
+# Pre-parsed endpoint URLs so request sites skip per-call f-string
+# formatting and URL parsing
+HEALTH_URL = httpx.URL(f"{API_BASE_URL}/health")
+CHAT_URL = httpx.URL(f"{API_BASE_URL}/chat")
+STATS_URL = httpx.URL(f"{API_BASE_URL}/stats")
+TEST_MESSAGES = [
+    "Hello, what is Brikkle?",
+    "How do I invest in real estate through Brikkle?",
+    "What are the minimum investment amounts?",
+    "How does property tokenization work?",
+    "What fees are involved?"
+]
+
+# Shared connection limits: the whole suite runs over a handful of
+# keep-alive connections instead of one socket per request
+LIMITS = httpx.Limits(max_keepalive_connections=20, max_connections=100)
+
+# Transient server statuses worth retrying instead of failing the run
+RETRY_STATUSES = {502, 503, 504}
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture(scope="session")
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture(scope="session")
+async def client():
+    """
+    One pooled client shared by the whole suite. HTTP/2 lets concurrent
+    tests multiplex over a single connection; fall back to HTTP/1.1
+    keep-alive when the h2 extra isn't installed. Skips every test when
+    the server isn't reachable.
+    """
+    client_options = {
+        "limits": LIMITS,
+        "headers": {"Content-Type": "application/json"},
+        "timeout": 60.0
+    }
+    try:
+        async_client = httpx.AsyncClient(http2=True, **client_options)
+    except ImportError:
+        async_client = httpx.AsyncClient(**client_options)
+
+    async with async_client:
+        # Warm the connection pool and check the server is actually up
+        try:
+            await async_client.head(HEALTH_URL, timeout=5)
+        except httpx.TransportError:
+            pytest.skip(f"Brikkle API server is not reachable at {API_BASE_URL}")
+        yield async_client
+
+
+async def _request_with_retry(client: httpx.AsyncClient,
+                              method: str,
+                              url: str,
+                              retries: int = 3,
+                              backoff: float = 0.3,
+                              **kwargs) -> httpx.Response:
+    """
+    Issue a request, retrying transport errors and transient 5xx statuses
+    with exponential backoff so one flaky round-trip doesn't force a full
+    suite re-run.
+
+    The request is built once and dispatched through client.send, so
+    header merging and body preparation aren't repeated per attempt.
+    """
+    request = client.build_request(method, url, **kwargs)
+    for attempt in range(retries + 1):
+        try:
+            response = await client.send(request)
+            if response.status_code not in RETRY_STATUSES or attempt == retries:
+                return response
+        except httpx.TransportError:
+            if attempt == retries:
+                raise
+        await asyncio.sleep(backoff * (2 ** attempt))
+
+
+def _flush_log(log: List[str]) -> None:
+    """
+    Write a test's buffered output in one stdout call. Per-line print()
+    flushes interleave syscalls with the HTTP round-trips and inflate
+    observed wall time, especially with a slow CI log sink.
+    """
+    sys.stdout.write("\n".join(log) + "\n")
+    sys.stdout.flush()
+    log.clear()
+
+
+async def _cached_get_json(client: httpx.AsyncClient, url: httpx.URL) -> Dict[str, Any]:
+    """
+    GET an idempotent endpoint, serving repeat developer runs from the
+    on-disk cache keyed by the server's build id. Always fetches fresh
+    when diskcache is missing, NO_TEST_CACHE is set, the server doesn't
+    send X-Build-Id (nothing would ever invalidate the entry), or the
+    key misses.
+    """
+    key = None
+    if CACHE is not None and not os.getenv("NO_TEST_CACHE"):
+        try:
+            head = await client.head(url, timeout=5)
+            build_id = head.headers.get("X-Build-Id")
+            if build_id is not None:
+                key = (str(url), build_id)
+                if key in CACHE:
+                    return CACHE[key]
+        except Exception:
+            key = None
+
+    response = await _request_with_retry(client, "GET", url)
+    response.raise_for_status()
+    data = orjson.loads(response.content)
+    if key is not None:
+        CACHE[key] = data
+    return data
+
+
+async def _inspect_chat_reply(data: Dict[str, Any], log: List[str]) -> None:
+    """Format one chat reply into the test log."""
+    if "session_id" in data:
+        log.append(f"📝 Session ID: {data['session_id'][:8]}...")
+
+    log.append(f"🤖 Bot Response: {data['message'][:100]}...")
+    log.append(f"⏰ Timestamp: {data['timestamp']}")
+
+    if data.get('sources'):
+        log.append(f"📚 Sources: {len(data['sources'])} documents")
+
+
+async def test_health_check(client: httpx.AsyncClient):
+    """The health check endpoint reports a healthy service."""
+    log = ["🔍 Testing health check..."]
+    try:
+        data = await _cached_get_json(client, HEALTH_URL)
+        log.append(f"✅ Health check passed: {data['status']}")
+    finally:
+        _flush_log(log)
+
+    assert data["status"] == "healthy"
+
+
+async def test_chat_endpoint(client: httpx.AsyncClient):
+    """The chat endpoint answers a conversation and keeps one session."""
+    log = ["\n💬 Testing chat endpoint with session management..."]
+
+    session_id = None
+    inspections = []
+
+    try:
+        for i, message in enumerate(TEST_MESSAGES, 1):
+            log.append(f"\n--- Test {i}: {message[:50]}... ---")
+
+            # Prepare request
+            request_data = {
+                "message": message,
+                "include_sources": False
+            }
+
+            # Add session_id if we have one (for continuation)
+            if session_id:
+                request_data["session_id"] = session_id
+
+            # Send request (messages stay sequential: each turn depends
+            # on the session state left by the previous one)
+            response = await _request_with_retry(
+                client, "POST", CHAT_URL,
+                content=orjson.dumps(request_data)
+            )
+
+            if response.status_code != 200:
+                # Keep failure logs bounded; decoding an arbitrary error
+                # body to str is only worth it when asked for
+                if os.getenv("BRIKKLE_VERBOSE"):
+                    log.append(f"Error: {response.text[:2048]}")
+                else:
+                    log.append(f"Error: {response.content[:256]!r}")
+                pytest.fail(f"Chat request {i} failed: {response.status_code}")
+
+            data = orjson.loads(response.content)
+
+            # Extract only what the next request needs; the rest of the
+            # response processing runs as a task so the next send isn't
+            # serialized behind it. The sleep(0) lets the task log
+            # before the next header line
+            session_id = data.get("session_id", session_id)
+            inspections.append(
+                asyncio.create_task(_inspect_chat_reply(data, log))
+            )
+            await asyncio.sleep(0)
+
+            # No delay by default; the endpoint enforces its own limits.
+            # Set BRIKKLE_TEST_THROTTLE (seconds) to pace requests if needed
+            if os.getenv("BRIKKLE_TEST_THROTTLE"):
+                await asyncio.sleep(float(os.environ["BRIKKLE_TEST_THROTTLE"]))
+
+        if inspections:
+            await asyncio.gather(*inspections)
+        log.append(f"\n✅ All chat tests passed! Final session ID: {session_id[:8] if session_id else 'None'}...")
+    finally:
+        _flush_log(log)
+
+    assert session_id, "Server never returned a session_id"
+
+
+async def test_stats_endpoint(client: httpx.AsyncClient):
+    """The stats endpoint reports service statistics."""
+    log = ["\n📊 Testing stats endpoint..."]
+    try:
+        data = await _cached_get_json(client, STATS_URL)
+        log.append("✅ Stats retrieved successfully")
+        log.append(f"📈 RAG Service Status: {data['status']}")
+        if 'rag_service' in data:
+            rag_stats = data['rag_service']
+            log.append(f"📄 Total Documents: {rag_stats.get('total_documents', 'N/A')}")
+            log.append(f"🔍 Vector Store Size: {rag_stats.get('vector_store_size', 'N/A')}")
+    finally:
+        _flush_log(log)
+
+    assert data["status"] == "operational"
+    assert "rag_service" in data
+
+
+async def test_new_session_creation(client: httpx.AsyncClient):
+    """A session is created when none is given and persists across turns."""
+    log = ["\n🆕 Testing new session creation..."]
+
+    try:
+        # First request without session_id
+        request_data = {
+            "message": "Hello, I'm starting a new conversation",
+            "include_sources": False
+        }
+
+        response = await _request_with_retry(
+            client, "POST", CHAT_URL,
+            content=orjson.dumps(request_data)
+        )
+        assert response.status_code == 200, f"First request failed: {response.status_code}"
+
+        data = orjson.loads(response.content)
+        session_id = data.get("session_id")
+        assert session_id, "No session_id returned"
+        log.append(f"✅ New session created: {session_id[:8]}...")
+
+        # Second request with the same session_id to test continuation
+        request_data["session_id"] = session_id
+        request_data["message"] = "This is a follow-up message in the same session"
+
+        response2 = await _request_with_retry(
+            client, "POST", CHAT_URL,
+            content=orjson.dumps(request_data)
+        )
+        assert response2.status_code == 200, f"Second request failed: {response2.status_code}"
+
+        data2 = orjson.loads(response2.content)
+        assert data2.get("session_id") == session_id, "Session ID changed unexpectedly"
+        log.append(f"✅ Session continuation works: {session_id[:8]}...")
+
+        # Third request to test that context is maintained (last 5 messages)
+        request_data["message"] = "What was my previous question?"
+        response3 = await _request_with_retry(
+            client, "POST", CHAT_URL,
+            content=orjson.dumps(request_data)
+        )
+        assert response3.status_code == 200, f"Third request failed: {response3.status_code}"
+
+        data3 = orjson.loads(response3.content)
+        assert data3.get("session_id") == session_id, "Session ID changed on third request"
+        log.append(f"✅ Context maintained across multiple messages: {session_id[:8]}...")
+    finally:
+        _flush_log(log)